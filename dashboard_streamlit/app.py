@@ -198,6 +198,27 @@ def load_dynamic_options(trade_type):
         'countries': db.get_countries(trade_type)
     }
 
+# Load HS hierarchy options (Dependent on Chapter / Heading)
+@st.cache_data(ttl=3600)
+def load_hs_headings(hs_chapter):
+    db = init_database()
+    return db.get_hs_headings(hs_chapter)
+
+@st.cache_data(ttl=3600)
+def load_hs_commodities(hs_chapter, hs_heading):
+    db = init_database()
+    return db.get_hs_commodities(hs_chapter, hs_heading)
+
+# Sidebar record count (Parquet footer read on the shared connection)
+@st.cache_data(ttl=3600)
+def load_record_count():
+    db = init_database()
+    if not db.legacy_parquet.exists():
+        return None
+    return db.conn.cursor().execute(
+        "SELECT COUNT(*) FROM read_parquet(?)", [str(db.legacy_parquet)]
+    ).fetchone()[0]
+
 # Query data (cached with shorter TTL for updates)
 @st.cache_data(ttl=600)
 def query_data(start_date, end_date, trade_type, province, destination, hs_chapter, hs_heading, hs_commodity, exclude_usa):
@@ -222,6 +243,23 @@ def query_data(start_date, end_date, trade_type, province, destination, hs_chapt
     query_time = time.time() - start_time
     return result, query_time
 
+# Concentration metrics (Tier 1 only — unaffected by lazy Tier 2/3 downloads)
+@st.cache_data(ttl=1800, max_entries=64)
+def query_concentration(start_date, end_date, trade_type, province, destination, hs_chapter, hs_heading, hs_commodity, exclude_usa):
+    """Query and cache concentration risk metrics."""
+    db = init_database()
+    return db.query_concentration_metrics({
+        'start_date': start_date,
+        'end_date': end_date,
+        'trade_type': trade_type,
+        'province': province,
+        'destination': destination,
+        'hs_chapter': hs_chapter,
+        'hs_heading': hs_heading,
+        'hs_commodity': hs_commodity,
+        'exclude_usa': exclude_usa
+    })
+
 # Initialize database and load common options
 db = init_database()
 common_options = load_common_options()
@@ -375,7 +413,7 @@ with st.sidebar.expander("📦 HS Product Classification", expanded=True):
     
     # Heading (4-digit) - depends on Chapter
     if hs_chapter != 'All':
-        headings = db.get_hs_headings(hs_chapter)
+        headings = load_hs_headings(hs_chapter)
         # Show full descriptions without truncation (heading already cleaned in Tier 2)
         heading_options = ['All'] + [
             f"{h['hs_heading']} - {h['heading']}"
@@ -397,7 +435,7 @@ with st.sidebar.expander("📦 HS Product Classification", expanded=True):
     
     # Commodity (8-digit) - depends on Heading
     if hs_heading != 'All':
-        commodities = db.get_hs_commodities(hs_chapter, hs_heading)
+        commodities = load_hs_commodities(hs_chapter, hs_heading)
         commodity_options = ['All'] + [f"{c['hs_code']} - {c['commodity'][:30]}..." 
                                         if len(c['commodity']) > 30 else f"{c['hs_code']} - {c['commodity']}"
                                         for c in commodities[:50]]  # Limit to 50 for performance
@@ -571,6 +609,10 @@ currency_label = f"CAD ({unit_suffix})" if unit_suffix else "CAD"
 
 # Data refresh button
 if st.sidebar.button("🔄 Refresh Data"):
+    # Re-check downloaded tier files against the latest release; a replaced
+    # file means the cached TradeDatabase (and its tables) must be rebuilt
+    if db.refresh_downloads():
+        st.cache_resource.clear()
     st.cache_data.clear()
     st.rerun()
 
@@ -580,13 +622,8 @@ st.sidebar.markdown("### ⚡ Performance")
 
 # Get database stats
 try:
-    import duckdb
-    from pathlib import Path
-    parquet_file = Path('data/processed/trade_records.parquet')
-    if parquet_file.exists():
-        temp_conn = duckdb.connect(':memory:')
-        total_records = temp_conn.execute(f"SELECT COUNT(*) FROM '{parquet_file}'").fetchone()[0]
-        temp_conn.close()
+    total_records = load_record_count()
+    if total_records is not None:
         st.sidebar.caption(f"📊 Database: {total_records:,} records")
     else:
         st.sidebar.caption("📊 Database: Loading...")
@@ -1315,17 +1352,17 @@ with deep_tab2:
     
     # Query concentration metrics
     with st.spinner("Calculating concentration metrics..."):
-        concentration_data = db.query_concentration_metrics({
-            'start_date': start_date,
-            'end_date': end_date,
-            'trade_type': trade_type,
-            'province': province,
-            'destination': destination,
-            'hs_chapter': hs_chapter,
-            'hs_heading': hs_heading,
-            'hs_commodity': hs_commodity,
-            'exclude_usa': exclude_usa
-        })
+        concentration_data = query_concentration(
+            start_date,
+            end_date,
+            trade_type,
+            province,
+            destination,
+            hs_chapter,
+            hs_heading,
+            hs_commodity,
+            exclude_usa
+        )
     
     market_conc = concentration_data['market_concentration']
     product_conc = concentration_data['product_concentration']
@@ -19,74 +19,16 @@ Display helpers:
 """
 
 import duckdb
-import pandas as pd
 import requests
 import os
 import json
 import glob as _glob
+import threading
 import streamlit as st
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Any, Optional
-
-# ---------------------------------------------------------------------------
-# Country display name overrides
-# Stored as "ISO - Name" in the parquet. This map produces the clean label
-# shown in the UI (no ISO prefix, corrected/shortened names where needed).
-# Keys must exactly match the raw destination string in trade_records.parquet.
-# ---------------------------------------------------------------------------
-_DEST_DISPLAY_NAMES: Dict[str, str] = {
-    # Historical name stored in data — remap to modern name
-    "UKR - Ukraine Soviet Socialist Republic": "Ukraine",
-    "CUW - Netherlands Antilles": "Netherlands Antilles (historical)",
-    "SRB - Former Yugoslavia": "Former Yugoslavia (historical)",
-
-    # Long/formal UN names → common English names
-    "USA - United States of America": "United States",
-    "GBR - United Kingdom": "United Kingdom",
-    "RUS - Russian Federation": "Russia",
-    "IRN - Iran": "Iran",
-    "PRK - Korea, North": "North Korea",
-    "KOR - Korea, South": "South Korea",
-    "COD - Congo, Democratic Republic of the": "DR Congo",
-    "COG - Congo, Republic of the": "Republic of Congo",
-    "TZA - Tanzania, United Republic of": "Tanzania",
-    "MDA - Moldova, Republic of": "Moldova",
-    "VNM - Viet Nam": "Vietnam",
-    "BRN - Brunei Darussalam": "Brunei",
-    "SYR - Syria": "Syria",
-    "LAO - Laos": "Laos",
-    "FSM - Micronesia, Federated States of": "Micronesia",
-    "MKD - North Macedonia": "North Macedonia",
-    "ZAF - South Africa, Republic of": "South Africa",
-    "BOL - Bolivia": "Bolivia",
-    "VEN - Venezuela": "Venezuela",
-    "GMB - Gambia": "Gambia",
-    "VAT - Holy See (Vatican City State)": "Vatican City",
-    "SHN - Saint Helena, Ascension and Tristan da Cunha": "Saint Helena",
-    "FLK - Falkland Islands (Malvinas)": "Falkland Islands",
-    "MAC - Macao": "Macao",
-    "XZZ - High Seas": "High Seas",
-    "TUR - Türkiye": "Turkey",
-    "CPV - Cabo Verde": "Cape Verde",
-    "SWZ - Eswatini": "Eswatini",
-    "BES - Bonaire, Sint Eustatius and Saba": "Bonaire & Sint Eustatius",
-    "CIV - Côte d'Ivoire": "Côte d'Ivoire",
-    "PSE - Palestine, State of": "Palestine",
-    "TWN - Taiwan": "Taiwan",
-}
-
-
-def dest_display_name(raw: str) -> str:
-    """
-    Convert a raw 'ISO - Name' destination string to its clean display label.
-    Falls back to stripping the ISO prefix if no explicit override exists.
-    """
-    if raw in _DEST_DISPLAY_NAMES:
-        return _DEST_DISPLAY_NAMES[raw]
-    if " - " in raw:
-        return raw.split(" - ", 1)[1]
-    return raw
-
+from typing import Callable, Dict, List, Any, Optional, Tuple
 
 # ---------------------------------------------------------------------------
 # Destination display-name helpers
@@ -131,6 +73,7 @@ _DEST_DISPLAY_NAMES: Dict[str, str] = {
 }
 
 
+@lru_cache(maxsize=4096)
 def dest_display_name(raw: str) -> str:
     """
     Convert a raw destination string (e.g. 'USA - United States of America')
@@ -140,12 +83,14 @@ def dest_display_name(raw: str) -> str:
       1. Exact match in _DEST_DISPLAY_NAMES override table
       2. Strip leading 'ISO - ' prefix
       3. Return raw unchanged
+
+    Memoized — the input domain is the ~250 raw destination strings.
     """
-    if raw in _DEST_DISPLAY_NAMES:
-        return _DEST_DISPLAY_NAMES[raw]
-    if " - " in raw:
-        return raw.split(" - ", 1)[1]
-    return raw
+    override = _DEST_DISPLAY_NAMES.get(raw)
+    if override is not None:
+        return override
+    _, sep, name = raw.partition(" - ")
+    return name if sep else raw
 
 
 # ---------------------------------------------------------------------------
@@ -162,6 +107,33 @@ _TIER3_URL_TEMPLATE = f"{_RELEASE_BASE}/trade_{{year}}.parquet"
 # Legacy monolithic file (fallback / build-from-source path)
 _LEGACY_URL = f"{_RELEASE_BASE}/trade_records.parquet"
 
+_DOWNLOAD_CHUNK_BYTES = 1 << 20    # 1 MiB per iter_content read
+_DOWNLOAD_BUFFER_BYTES = 8 << 20   # 8 MiB userspace write buffer
+_DOWNLOAD_PROGRESS_BYTES = 4 << 20 # 4 MiB between progress callbacks
+
+
+# ---------------------------------------------------------------------------
+# DuckDB session settings
+# ---------------------------------------------------------------------------
+_DUCKDB_THREADS = min(8, os.cpu_count() or 4)
+_DUCKDB_MEMORY_LIMIT = "2GB"
+
+# Tier 1 parquet at or below this size is loaded into a native DuckDB table
+# (sorted by date for zone-map pruning); larger files stay as a view.
+_TIER1_MATERIALIZE_MAX_BYTES = 512 * 1_048_576
+
+# Low-cardinality Tier 1 dimensions stored as ENUMs in the native table, so
+# GROUP BY / filters hash small integer codes instead of strings.
+_TIER1_ENUM_COLUMNS = ("trade_type", "province", "destination", "hs_chapter")
+
+# Same for Tier 2, sorted by chapter — every Tier 2 query is chapter-scoped.
+_TIER2_MATERIALIZE_MAX_BYTES = 128 * 1_048_576
+
+# Filter keys with no matching column in Tier 1 (chapter-level summary) or
+# Tier 2 (heading-level); they are dropped before that tier's WHERE clause.
+_TIER1_UNFILTERED_KEYS = frozenset({"hs_heading", "hs_commodity"})
+_TIER2_UNFILTERED_KEYS = frozenset({"hs_commodity"})
+
 
 # ---------------------------------------------------------------------------
 # TradeDatabase
@@ -198,19 +170,44 @@ class TradeDatabase:
         self.tier3_dir    = self.data_dir / "trade_by_year"
         self.metadata_file = self.data_dir / "tier_metadata.json"
 
-        # Legacy monolithic parquet (still used as fallback / source)
+        # Legacy monolithic parquet (still used as fallback / source), and
+        # the same records as a Hive-partitioned dataset (trade_type / year)
         self.legacy_parquet = self.data_dir / "trade_records.parquet"
+        self.legacy_partitioned_dir = self.data_dir / "trade_records"
 
         # ── State flags ─────────────────────────────────────────────────────
         self._tier2_loaded: bool = False
         self._tier3_years_loaded: set = set()
+        # Year files the current tier3 view was built over
+        self._tier3_files: List[str] = []
+
+        # ── In-memory lookups (built lazily on first use) ───────────────────
+        # "All" plus each HS chapter → its headings; Tier 2 is immutable once
+        # downloaded, so one scan answers every later Heading dropdown.
+        self._headings_by_chapter: Optional[Dict[str, List[Dict[str, str]]]] = None
 
         # ── DuckDB (in-memory) ───────────────────────────────────────────────
         self.conn = duckdb.connect(':memory:')
+        self._configure_connection()
 
         # ── Initialize views from whatever data is available ─────────────────
         self._initialize_views()
 
+    def _configure_connection(self) -> None:
+        """
+        Tune the DuckDB session for repeated Parquet scans.
+
+        The object cache keeps Parquet footers / row-group metadata between
+        queries, and every query here carries its own ORDER BY, so insertion
+        order need not be preserved during scans. DuckDB's own terminal
+        progress bar is switched off — Streamlit renders progress itself.
+        """
+        self.conn.execute("SET enable_object_cache = true")
+        self.conn.execute(f"SET threads = {_DUCKDB_THREADS}")
+        self.conn.execute(f"SET memory_limit = '{_DUCKDB_MEMORY_LIMIT}'")
+        self.conn.execute("SET preserve_insertion_order = false")
+        self.conn.execute("SET enable_progress_bar = false")
+
     # ────────────────────────────────────────────────────────────────────────
     # Data availability checks
     # ────────────────────────────────────────────────────────────────────────
@@ -224,14 +221,121 @@ class TradeDatabase:
     def has_tier3_year(self, year: int) -> bool:
         return (self.tier3_dir / f"trade_{year}.parquet").exists()
 
+    def has_legacy(self) -> bool:
+        return self.legacy_partitioned_dir.is_dir() or self.legacy_parquet.exists()
+
     def has_data(self) -> bool:
         """True if at least Tier 1 (or legacy) data is present."""
-        return self.has_tier1() or self.legacy_parquet.exists()
+        return self.has_tier1() or self.has_legacy()
 
     # ────────────────────────────────────────────────────────────────────────
     # Downloader helpers
     # ────────────────────────────────────────────────────────────────────────
 
+    def _fetch_to_file(
+        self,
+        url: str,
+        dest: Path,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+    ) -> bool:
+        """
+        Stream *url* to *dest* without any Streamlit UI (safe off-thread).
+
+        The body is written to ``<dest>.part`` and renamed into place only on
+        success, so an interrupted transfer is resumed with a ``Range`` request
+        on the next call; the ETag of the partial body is kept in
+        ``<dest>.part.etag`` as the ``If-Range`` validator. Once the rename
+        succeeds the ETag moves to ``<dest>.etag``; if *dest* already exists
+        and a ``HEAD`` returns that same ETag, nothing is fetched.
+
+        Args:
+            url:         Source URL
+            dest:        Final file path
+            on_progress: Optional callback(bytes_done, total_bytes); total is
+                         0 when the server sends no content-length
+
+        Returns:
+            False if the existing file was already current, True otherwise.
+
+        Raises:
+            requests.exceptions.RequestException on network/HTTP failure.
+        """
+        part = dest.with_name(dest.name + ".part")
+        etag_file = dest.with_name(dest.name + ".etag")
+        part_etag_file = dest.with_name(dest.name + ".part.etag")
+
+        def _read_etag(path: Path) -> Optional[str]:
+            return path.read_text(encoding="utf-8").strip() if path.exists() else None
+
+        # Revalidate an existing copy — skip the transfer if unchanged
+        saved_etag = _read_etag(etag_file)
+        if dest.exists() and saved_etag:
+            head = requests.head(url, allow_redirects=True, timeout=30)
+            if head.ok and head.headers.get("ETag") == saved_etag:
+                return False
+
+        # Resume a partial download left by an earlier failure
+        headers = {}
+        part_etag = _read_etag(part_etag_file)
+        resume_from = part.stat().st_size if part.exists() else 0
+        if resume_from and part_etag:
+            headers["Range"] = f"bytes={resume_from}-"
+            headers["If-Range"] = part_etag
+        else:
+            resume_from = 0
+
+        response = requests.get(url, headers=headers, stream=True, timeout=300)
+        if response.status_code == 416:
+            # Range not satisfiable — the .part is already complete (the
+            # process died before the rename) or no longer matches; discard
+            # it and fetch the whole file rather than failing on every retry
+            response.close()
+            part.unlink(missing_ok=True)
+            part_etag_file.unlink(missing_ok=True)
+            resume_from = 0
+            response = requests.get(url, stream=True, timeout=300)
+        response.raise_for_status()
+
+        if response.status_code != 206:
+            # Server ignored the range (or the file changed) — start over
+            resume_from = 0
+
+        etag = response.headers.get("ETag")
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if etag:
+            part_etag_file.write_text(etag, encoding="utf-8")
+        else:
+            part_etag_file.unlink(missing_ok=True)
+
+        total_size = int(response.headers.get("content-length", 0))
+        if total_size > 0:
+            total_size += resume_from
+
+        # 1 MiB reads into an 8 MiB write buffer keep the Python loop to
+        # roughly one iteration per MiB; progress (a UI redraw when called
+        # from _download_file) is only reported every few MiB
+        downloaded = reported = resume_from
+        with open(part, "ab" if resume_from else "wb", buffering=_DOWNLOAD_BUFFER_BYTES) as f:
+            for chunk in response.iter_content(chunk_size=_DOWNLOAD_CHUNK_BYTES):
+                if chunk:
+                    f.write(chunk)
+                    downloaded += len(chunk)
+                    if (on_progress is not None
+                            and downloaded - reported >= _DOWNLOAD_PROGRESS_BYTES):
+                        on_progress(downloaded, total_size)
+                        reported = downloaded
+        if on_progress is not None and downloaded != reported:
+            on_progress(downloaded, total_size)
+
+        os.replace(part, dest)
+        # Only a fully written file is recorded as current
+        if etag:
+            etag_file.write_text(etag, encoding="utf-8")
+        else:
+            etag_file.unlink(missing_ok=True)
+        part_etag_file.unlink(missing_ok=True)
+        return True
+
     def _download_file(
         self,
         url: str,
@@ -241,40 +345,31 @@ class TradeDatabase:
         """
         Stream-download *url* to *dest* with a Streamlit progress bar.
 
+        See _fetch_to_file for the resume / ETag revalidation behaviour.
         Raises st.stop() on failure so the dashboard surfaces a clear error.
         """
-        try:
-            response = requests.get(url, stream=True, timeout=300)
-            response.raise_for_status()
-
-            total_size = int(response.headers.get("content-length", 0))
-            dest.parent.mkdir(parents=True, exist_ok=True)
+        pbar = st.progress(0, text=f"Downloading {label}…")
 
+        def _update(downloaded: int, total_size: int) -> None:
             if total_size > 0:
-                pbar = st.progress(0, text=f"Downloading {label}…")
-                downloaded = 0
-                with open(dest, "wb") as f:
-                    for chunk in response.iter_content(chunk_size=65_536):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            pct = min(downloaded / total_size, 1.0)
-                            mb_done = downloaded / 1_048_576
-                            mb_total = total_size / 1_048_576
-                            pbar.progress(
-                                pct,
-                                text=f"Downloading {label}: "
-                                     f"{mb_done:.1f} / {mb_total:.1f} MB",
-                            )
-                pbar.empty()
-            else:
-                # No content-length header — download without progress
-                with open(dest, "wb") as f:
-                    f.write(response.content)
+                pct = min(downloaded / total_size, 1.0)
+                mb_done = downloaded / 1_048_576
+                mb_total = total_size / 1_048_576
+                pbar.progress(
+                    pct,
+                    text=f"Downloading {label}: "
+                         f"{mb_done:.1f} / {mb_total:.1f} MB",
+                )
 
-            st.success(f"✅ {label} downloaded successfully!")
+        try:
+            fetched = self._fetch_to_file(url, dest, _update)
+            pbar.empty()
+            if fetched:
+                st.success(f"✅ {label} downloaded successfully!")
 
         except requests.exceptions.RequestException as e:
+            # Keep any .part file so the next attempt can resume it
+            pbar.empty()
             st.error(f"❌ Failed to download {label}: {e}")
             st.info(
                 f"**Manual option:** download from `{url}` "
@@ -282,6 +377,7 @@ class TradeDatabase:
             )
             st.stop()
         except Exception as e:
+            pbar.empty()
             st.error(f"❌ Unexpected error downloading {label}: {e}")
             st.stop()
 
@@ -289,6 +385,13 @@ class TradeDatabase:
         """Download Tier 1 (chapter summary, ~25 MB) on cold-start."""
         self._download_file(_TIER1_URL, self.tier1_file, "chapter summary (Tier 1)")
 
+    def _download_trade_data(self) -> None:
+        """
+        Cold-start provisioning entry point used by app.py when has_data()
+        is False. Only Tier 1 is fetched; Tiers 2/3 stay lazy.
+        """
+        self._download_tier1()
+
     def _ensure_tier2(self) -> None:
         """Download Tier 2 (heading summary, ~80 MB) if not already present."""
         if not self.has_tier2():
@@ -301,50 +404,263 @@ class TradeDatabase:
 
     def _ensure_tier3_year(self, year: int) -> None:
         """Download a single Tier 3 year file (~12 MB) if not already present."""
-        if not self.has_tier3_year(year):
-            dest = self.tier3_dir / f"trade_{year}.parquet"
-            self.tier3_dir.mkdir(parents=True, exist_ok=True)
-            url = _TIER3_URL_TEMPLATE.format(year=year)
-            with st.spinner(f"Loading {year} commodity data (first time only)…"):
-                self._download_file(url, dest, f"commodity data {year} (Tier 3)")
+        self._ensure_tier3_years([year])
+
+    def _ensure_tier3_years(self, years: List[int]) -> None:
+        """
+        Download all missing Tier 3 year files concurrently.
+
+        Transfers run on a thread pool (no Streamlit calls off the script
+        thread); this thread aggregates their byte counts into one progress
+        bar. Callers re-register the tier3 view once afterwards.
+        """
+        missing = [y for y in dict.fromkeys(years) if not self.has_tier3_year(y)]
+        if not missing:
+            return
+
+        self.tier3_dir.mkdir(parents=True, exist_ok=True)
+        label = (
+            f"commodity data {', '.join(str(y) for y in missing)} (Tier 3)"
+        )
+
+        lock = threading.Lock()
+        progress: Dict[int, Tuple[int, int]] = {y: (0, 0) for y in missing}
+
+        def _reporter(year: int) -> Callable[[int, int], None]:
+            def _report(downloaded: int, total_size: int) -> None:
+                with lock:
+                    progress[year] = (downloaded, total_size)
+            return _report
+
+        errors: List[Tuple[int, BaseException]] = []
+        with st.spinner(f"Loading {label} (first time only)…"):
+            pbar = st.progress(0, text=f"Downloading {label}…")
+            with ThreadPoolExecutor(max_workers=min(len(missing), 8)) as pool:
+                futures = {
+                    pool.submit(
+                        self._fetch_to_file,
+                        _TIER3_URL_TEMPLATE.format(year=y),
+                        self.tier3_dir / f"trade_{y}.parquet",
+                        _reporter(y),
+                    ): y
+                    for y in missing
+                }
+                pending = set(futures)
+                while pending:
+                    _, pending = wait(pending, timeout=0.25)
+                    with lock:
+                        done = sum(d for d, _ in progress.values())
+                        total = sum(t for _, t in progress.values())
+                    if total > 0:
+                        pbar.progress(
+                            min(done / total, 1.0),
+                            text=f"Downloading {label}: "
+                                 f"{done / 1_048_576:.1f} / "
+                                 f"{total / 1_048_576:.1f} MB",
+                        )
+                errors = [
+                    (futures[f], f.exception())
+                    for f in futures if f.exception() is not None
+                ]
+            pbar.empty()
+
+        if errors:
+            for year, e in errors:
+                st.error(f"❌ Failed to download commodity data {year} (Tier 3): {e}")
+            st.info(
+                f"**Manual option:** download from `{_TIER3_URL_TEMPLATE}` "
+                f"and place in `{self.tier3_dir}`"
+            )
+            st.stop()
+
+        st.success(f"✅ {label} downloaded successfully!")
+
+    def refresh_downloads(self) -> bool:
+        """
+        Revalidate previously downloaded tier files against the release.
+
+        Only files with a ``.etag`` sidecar (i.e. fetched by this class) are
+        checked — one ``HEAD`` each, with a transfer only when the release
+        asset has changed. Manually placed files are left untouched. A file
+        that cannot be checked only raises a warning, so a refresh still
+        works when the release host is unreachable; a progress bar is only
+        drawn once a transfer actually starts.
+
+        Returns:
+            True if any file was replaced (the views must be rebuilt).
+        """
+        targets = [
+            (_TIER1_URL, self.tier1_file, "chapter summary (Tier 1)"),
+            (_TIER2_URL, self.tier2_file, "heading summary (Tier 2)"),
+        ]
+        for path in sorted(self.tier3_dir.glob("trade_*.parquet")):
+            year = path.stem[len("trade_"):]
+            targets.append((
+                _TIER3_URL_TEMPLATE.format(year=year), path,
+                f"commodity data {year} (Tier 3)",
+            ))
+
+        changed = False
+        for url, dest, label in targets:
+            if not (dest.exists() and dest.with_name(dest.name + ".etag").exists()):
+                continue
+
+            pbar = None
+
+            def _update(downloaded: int, total_size: int) -> None:
+                nonlocal pbar
+                if pbar is None:
+                    pbar = st.progress(0, text=f"Updating {label}…")
+                if total_size > 0:
+                    pbar.progress(
+                        min(downloaded / total_size, 1.0),
+                        text=f"Updating {label}: "
+                             f"{downloaded / 1_048_576:.1f} / "
+                             f"{total_size / 1_048_576:.1f} MB",
+                    )
+
+            try:
+                if self._fetch_to_file(url, dest, _update):
+                    changed = True
+                    st.success(f"✅ {label} updated")
+            except requests.exceptions.RequestException as e:
+                # Keep the current copy (and any .part for a later resume)
+                st.warning(f"⚠️ Could not check {label} for updates: {e}")
+            finally:
+                if pbar is not None:
+                    pbar.empty()
+        return changed
 
     # ────────────────────────────────────────────────────────────────────────
     # View registration
     # ────────────────────────────────────────────────────────────────────────
 
+    # Views project only the columns the dashboard reads, so Parquet column
+    # chunks outside these lists are never fetched.
+
+    def _drop_relation(self, name: str) -> None:
+        """
+        Drop *name* whichever kind of relation it currently is.
+
+        A tier may switch between VIEW and TABLE (placeholder vs. file on
+        disk, or a file crossing its materialize budget), and DuckDB's
+        CREATE OR REPLACE / DROP ... IF EXISTS both refuse the other kind.
+        """
+        row = self.conn.execute("""
+            SELECT table_type FROM information_schema.tables
+            WHERE table_schema = 'main' AND table_name = ?
+        """, [name]).fetchone()
+        if row is not None:
+            kind = "VIEW" if row[0] == "VIEW" else "TABLE"
+            self.conn.execute(f"DROP {kind} {name}")
+
     def _register_tier1_view(self) -> None:
+        """
+        Register Tier 1. Small enough files are copied once into a native
+        table ordered by date, so date-range filters skip row groups via
+        DuckDB's min/max zone maps instead of re-reading Parquet per query.
+        """
+        source = f"read_parquet('{self.tier1_file}')"
+        dims = {col: col for col in _TIER1_ENUM_COLUMNS}
+        # Re-registration: drop the old relation, then its ENUM types, which
+        # are stale once the file has changed
+        self._drop_relation("tier1")
+        for col in _TIER1_ENUM_COLUMNS:
+            self.conn.execute(f"DROP TYPE IF EXISTS tier1_{col}")
+        if self.tier1_file.stat().st_size <= _TIER1_MATERIALIZE_MAX_BYTES:
+            relation, order_by = "TABLE", "ORDER BY date"
+            for col in _TIER1_ENUM_COLUMNS:
+                # Members in sorted order, so ORDER BY on the ENUM matches
+                # the string ordering every query already relies on
+                self.conn.execute(f"""
+                    CREATE TYPE tier1_{col} AS ENUM (
+                        SELECT DISTINCT {col} FROM {source}
+                        WHERE {col} IS NOT NULL ORDER BY {col}
+                    )
+                """)
+                dims[col] = f"CAST({col} AS tier1_{col}) AS {col}"
+        else:
+            relation, order_by = "VIEW", ""
         self.conn.execute(f"""
-            CREATE OR REPLACE VIEW tier1 AS
-            SELECT * FROM read_parquet('{self.tier1_file}')
+            CREATE {relation} tier1 AS
+            SELECT
+                date, year, {dims['trade_type']}, {dims['province']},
+                {dims['destination']}, destination_name, destination_iso,
+                starts_with(destination, 'USA - ') AS is_usa,
+                {dims['hs_chapter']}, chapter_name, chapter_summary,
+                category, category_color,
+                value, record_count
+            FROM {source}
+            {order_by}
         """)
 
     def _register_tier2_view(self) -> None:
+        """
+        Register Tier 2. Within budget it is decoded once into a native
+        table ordered by chapter, so the chapter-scoped heading queries skip
+        row groups instead of decoding Parquet on every chapter change.
+        """
+        if self.tier2_file.stat().st_size <= _TIER2_MATERIALIZE_MAX_BYTES:
+            relation, order_by = "TABLE", "ORDER BY hs_chapter, date"
+        else:
+            relation, order_by = "VIEW", ""
+        # Replaces the empty-mode placeholder view once the file arrives
+        self._drop_relation("tier2")
         self.conn.execute(f"""
-            CREATE OR REPLACE VIEW tier2 AS
-            SELECT * FROM read_parquet('{self.tier2_file}')
+            CREATE {relation} tier2 AS
+            SELECT
+                date, year, trade_type, province,
+                destination, destination_name,
+                starts_with(destination, 'USA - ') AS is_usa,
+                hs_chapter, chapter_name, hs_heading, heading_name,
+                value
+            FROM read_parquet('{self.tier2_file}')
+            {order_by}
         """)
 
     def _register_tier3_view(self) -> None:
-        """Register a glob view over all downloaded Tier 3 year files."""
-        pattern = str(self.tier3_dir / "trade_*.parquet")
-        files = _glob.glob(pattern)
-        if files:
+        """
+        Register a view over all downloaded Tier 3 year files.
+
+        The explicit file list spares DuckDB its own directory scan, and the
+        view is only rebuilt when the set of files on disk has changed. It
+        carries just the commodity lookup columns get_hs_commodities reads,
+        so a year file missing any other column cannot break startup.
+        """
+        files = sorted(_glob.glob(str(self.tier3_dir / "trade_*.parquet")))
+        if files and files != self._tier3_files:
+            file_list = ", ".join(f"'{f}'" for f in files)
             self.conn.execute(f"""
                 CREATE OR REPLACE VIEW tier3 AS
-                SELECT * FROM read_parquet('{pattern}')
+                SELECT year, hs_chapter, hs_heading, hs_code, commodity
+                FROM read_parquet([{file_list}])
             """)
+            self._tier3_files = files
 
     def _register_legacy_view(self) -> None:
-        """Fallback: register the old monolithic parquet as both tier1 and trade_records."""
-        pattern = str(self.data_dir / "trade_records*.parquet")
+        """Fallback: register the legacy records as trade_records and materialize tier1 from it."""
+        if self.legacy_partitioned_dir.is_dir():
+            # Partition columns come from the directory names, so filters on
+            # trade_type / year prune whole files before they are opened
+            pattern = str(self.legacy_partitioned_dir / "**" / "*.parquet")
+            source = f"read_parquet('{pattern}', hive_partitioning = true)"
+        else:
+            pattern = str(self.data_dir / "trade_records*.parquet")
+            source = f"read_parquet('{pattern}')"
+        # Only the columns the tier1 aggregate reads — the legacy schema also
+        # carries commodity-level text and quantity columns that are skipped
         self.conn.execute(f"""
             CREATE OR REPLACE VIEW trade_records AS
-            SELECT * FROM read_parquet('{pattern}')
+            SELECT
+                date, year, trade_type, province, destination,
+                hs_chapter, chapter, value
+            FROM {source}
         """)
-        # Expose the legacy data as tier1 using pre-computation at query time
-        # (legacy file has raw columns without enrichment columns)
+        # Expose the legacy data as tier1. The legacy file has raw columns
+        # without enrichment, so the monthly chapter aggregate is materialized
+        # once here rather than replayed by every query against a view.
         self.conn.execute("""
-            CREATE OR REPLACE VIEW tier1 AS
+            CREATE OR REPLACE TABLE tier1 AS
             SELECT
                 date_trunc('month', date)::DATE AS date,
                 CAST(year AS SMALLINT) AS year,
@@ -357,6 +673,7 @@ class TradeDatabase:
                 CASE WHEN destination LIKE '% - %'
                      THEN split_part(destination, ' - ', 1)
                      ELSE NULL END AS destination_iso,
+                starts_with(destination, 'USA - ') AS is_usa,
                 hs_chapter,
                 CASE WHEN chapter LIKE '% - %'
                      THEN regexp_replace(chapter, '^[^-]+ - ', '')
@@ -369,6 +686,7 @@ class TradeDatabase:
             FROM trade_records
             WHERE hs_chapter IS NOT NULL
             GROUP BY ALL
+            ORDER BY date
         """)
 
     def _register_empty_views(self) -> None:
@@ -382,6 +700,7 @@ class TradeDatabase:
                 CAST(NULL AS VARCHAR) AS destination,
                 CAST(NULL AS VARCHAR) AS destination_name,
                 CAST(NULL AS VARCHAR) AS destination_iso,
+                CAST(false AS BOOLEAN) AS is_usa,
                 CAST(NULL AS VARCHAR) AS hs_chapter,
                 CAST(NULL AS VARCHAR) AS chapter_name,
                 CAST(NULL AS VARCHAR) AS chapter_summary,
@@ -394,16 +713,61 @@ class TradeDatabase:
         self.conn.execute(f"CREATE OR REPLACE VIEW tier1 AS {empty_tier1}")
         self.conn.execute(f"CREATE OR REPLACE VIEW tier2 AS {empty_tier1}")
 
+    def _register_dimension_tables(self) -> None:
+        """
+        Materialize the small distinct-value tables behind the filter widgets.
+
+        One scan of tier1 at startup replaces a DISTINCT scan per dropdown
+        population; the resulting tables hold at most a few thousand rows.
+        dim_date_range holds the single min/max row for the date pickers.
+        """
+        self.conn.execute("""
+            CREATE OR REPLACE TABLE dim_date_range AS
+            SELECT
+                MIN(date) AS min_date,
+                MAX(date) AS max_date,
+                MIN(year) AS min_year,
+                MAX(year) AS max_year
+            FROM tier1
+        """)
+        self.conn.execute("""
+            CREATE OR REPLACE TABLE dim_chapters AS
+            SELECT DISTINCT hs_chapter, chapter_name
+            FROM tier1
+            WHERE hs_chapter IS NOT NULL
+        """)
+        self.conn.execute("""
+            CREATE OR REPLACE TABLE dim_trade_types AS
+            SELECT DISTINCT trade_type
+            FROM tier1
+            WHERE trade_type IS NOT NULL
+        """)
+        self.conn.execute("""
+            CREATE OR REPLACE TABLE dim_provinces AS
+            SELECT DISTINCT province, trade_type
+            FROM tier1
+            WHERE province IS NOT NULL
+              AND province != 'Canada (Total)'
+        """)
+        self.conn.execute("""
+            CREATE OR REPLACE TABLE dim_destinations AS
+            SELECT DISTINCT destination, destination_name, trade_type
+            FROM tier1
+            WHERE destination IS NOT NULL
+        """)
+
     def _initialize_views(self) -> None:
         """
         Register DuckDB views based on whatever files are available:
           1. Tier 1 parquet → preferred
-          2. Legacy monolithic parquet → fallback
+          2. Legacy parquet (partitioned dataset or monolithic file) → fallback
           3. Empty views → no data yet
+
+        Then precompute the filter dimension tables from tier1.
         """
         if self.has_tier1():
             self._register_tier1_view()
-        elif self.legacy_parquet.exists():
+        elif self.has_legacy():
             self._register_legacy_view()
         else:
             self._register_empty_views()
@@ -413,8 +777,37 @@ class TradeDatabase:
             self._register_tier2_view()
 
         # Tier 3 view (optional — registered if any year files already exist)
-        if self.tier3_dir.exists() and list(self.tier3_dir.glob("trade_*.parquet")):
-            self._register_tier3_view()
+        self._register_tier3_view()
+
+        # Filter-widget lookup tables (always built — tier1 exists in every mode)
+        self._register_dimension_tables()
+
+    # ────────────────────────────────────────────────────────────────────────
+    # Result helpers
+    # ────────────────────────────────────────────────────────────────────────
+
+    def _cursor(self) -> duckdb.DuckDBPyConnection:
+        """
+        Return a fresh cursor on the shared in-memory database.
+
+        The instance is shared across sessions via st.cache_resource; a
+        DuckDBPyConnection serializes its callers, so read queries each take
+        their own cursor and concurrent sessions run side by side.
+        """
+        return self.conn.cursor()
+
+    def _fetch_records(
+        self, sql: str, params: Optional[List[Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Execute *sql* and return rows as a list of dicts.
+
+        Builds the records straight from the DuckDB result tuples, skipping
+        the pandas DataFrame round-trip of .df().to_dict("records").
+        """
+        cursor = self._cursor().execute(sql, params or [])
+        columns = [d[0] for d in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
     # ────────────────────────────────────────────────────────────────────────
     # Filter helpers
@@ -423,70 +816,67 @@ class TradeDatabase:
     def get_common_options(self) -> Dict[str, Any]:
         """
         Return static filter options (chapters, date range, trade types).
-        These are read from Tier 1.
+
+        Fetched in a single round-trip over the precomputed dimension
+        tables — no Tier 1 scan at call time.
         """
+        default_date_range = {
+            "min_date": "2023-01-01",
+            "max_date": "2025-12-31",
+            "min_year": 2023,
+            "max_year": 2025,
+        }
         try:
-            chapters = self.conn.execute("""
-                SELECT DISTINCT hs_chapter, chapter_name
-                FROM tier1
-                WHERE hs_chapter IS NOT NULL
-                ORDER BY hs_chapter
-            """).df().rename(columns={"chapter_name": "chapter"}).to_dict("records")
-
-            date_res = self.conn.execute("""
-                SELECT
-                    MIN(date)  AS min_date,
-                    MAX(date)  AS max_date,
-                    MIN(year)  AS min_year,
-                    MAX(year)  AS max_year
-                FROM tier1
-            """).df()
+            chapters, trade_types, min_date, max_date, min_year, max_year = (
+                self._cursor().execute("""
+                    SELECT
+                        (SELECT list(
+                                    struct_pack(hs_chapter := hs_chapter,
+                                                chapter    := chapter_name)
+                                    ORDER BY hs_chapter)
+                         FROM dim_chapters)                       AS chapters,
+                        (SELECT list(trade_type ORDER BY trade_type)
+                         FROM dim_trade_types)                    AS trade_types,
+                        min_date,
+                        max_date,
+                        min_year,
+                        max_year
+                    FROM dim_date_range
+                """).fetchone()
+            )
 
-            if date_res.empty or date_res.iloc[0]["min_date"] is None:
+            if min_date is None:
+                date_range = default_date_range
+            else:
                 date_range = {
-                    "min_date": "2023-01-01",
-                    "max_date": "2025-12-31",
-                    "min_year": 2023,
-                    "max_year": 2025,
+                    "min_date": min_date,
+                    "max_date": max_date,
+                    "min_year": min_year,
+                    "max_year": max_year,
                 }
-            else:
-                date_range = date_res.iloc[0].to_dict()
-
-            trade_types = self.conn.execute("""
-                SELECT DISTINCT trade_type
-                FROM tier1
-                WHERE trade_type IS NOT NULL
-                ORDER BY trade_type
-            """).df()["trade_type"].tolist()
-
-            if not trade_types:
-                trade_types = ["Export", "Import"]
 
             return {
-                "chapters": chapters,
+                "chapters": chapters or [],
                 "date_range": date_range,
-                "trade_types": trade_types,
+                "trade_types": trade_types or ["Export", "Import"],
             }
         except Exception:
             return {
                 "chapters": [],
-                "date_range": {
-                    "min_date": "2023-01-01",
-                    "max_date": "2025-12-31",
-                    "min_year": 2023,
-                    "max_year": 2025,
-                },
+                "date_range": default_date_range,
                 "trade_types": ["Export", "Import"],
             }
 
     def get_provinces(self, trade_type: str = "All") -> List[str]:
-        """Return distinct provinces from Tier 1, optionally filtered by trade type."""
-        where = "province != 'Canada (Total)'"
-        if trade_type != "All":
-            where += f" AND trade_type = '{trade_type}'"
-        return self.conn.execute(f"""
-            SELECT DISTINCT province FROM tier1 WHERE {where} ORDER BY province
-        """).df()["province"].tolist()
+        """Return distinct provinces, optionally filtered by trade type."""
+        # Fixed query text with bound parameters — the 'All' branch is folded
+        # into the predicate so every call shares one statement shape.
+        return [r[0] for r in self._cursor().execute("""
+            SELECT DISTINCT province
+            FROM dim_provinces
+            WHERE ? = 'All' OR trade_type = ?
+            ORDER BY province
+        """, [trade_type, trade_type]).fetchall()]
 
     def get_countries(self, trade_type: str = 'All') -> Dict[str, str]:
         """
@@ -497,16 +887,12 @@ class TradeDatabase:
             e.g. {"United States": "USA - United States of America", ...}
             Sorted alphabetically by display name.
         """
-        where_clause = "destination IS NOT NULL"
-        if trade_type != 'All':
-            where_clause += f" AND trade_type = '{trade_type}'"
-
-        raw_list = self.conn.execute(f"""
+        raw_list = [r[0] for r in self._cursor().execute("""
             SELECT DISTINCT destination
-            FROM trade_records
-            WHERE {where_clause}
+            FROM dim_destinations
+            WHERE (? = 'All' OR trade_type = ?)
             ORDER BY destination
-        """).df()['destination'].tolist()
+        """, [trade_type, trade_type]).fetchall()]
 
         # Build display_name -> raw mapping, deduplicating on display name
         # (historical duplicates like Netherlands Antilles / Curaçao share ISO
@@ -529,25 +915,35 @@ class TradeDatabase:
     def get_hs_headings(self, chapter: str = None) -> List[Dict[str, str]]:
         """
         Return HS headings, optionally filtered by chapter.
-        Uses Tier 2 if available (lazy-loaded), otherwise Tier 3.
+        Uses Tier 2 (lazy-loaded); answered from an in-memory index after
+        the first call.
         """
         self._ensure_tier2()
 
-        if chapter and chapter != "All":
-            query = f"""
-                SELECT DISTINCT hs_heading, heading_name AS heading
-                FROM tier2
-                WHERE hs_chapter = '{chapter}' AND hs_heading IS NOT NULL
-                ORDER BY hs_heading
-            """
-        else:
-            query = """
-                SELECT DISTINCT hs_heading, heading_name AS heading
-                FROM tier2
-                WHERE hs_heading IS NOT NULL
-                ORDER BY hs_heading
-            """
-        return self.conn.execute(query).df().to_dict("records")
+        if self._headings_by_chapter is None:
+            self._headings_by_chapter = self._build_headings_index()
+
+        key = chapter if chapter and chapter != "All" else "All"
+        return self._headings_by_chapter.get(key, [])
+
+    def _build_headings_index(self) -> Dict[str, List[Dict[str, str]]]:
+        """Group every Tier 2 heading by chapter in one DISTINCT scan."""
+        rows = self._cursor().execute("""
+            SELECT DISTINCT hs_chapter, hs_heading, heading_name
+            FROM tier2
+            WHERE hs_heading IS NOT NULL
+            ORDER BY hs_heading, hs_chapter
+        """).fetchall()
+
+        index: Dict[str, List[Dict[str, str]]] = {"All": []}
+        seen = set()
+        for hs_chapter, hs_heading, heading in rows:
+            record = {"hs_heading": hs_heading, "heading": heading}
+            index.setdefault(hs_chapter, []).append(record)
+            if (hs_heading, heading) not in seen:
+                seen.add((hs_heading, heading))
+                index["All"].append(record)
+        return index
 
     def get_hs_commodities(
         self, chapter: str = None, heading: str = None, years: List[int] = None
@@ -562,34 +958,31 @@ class TradeDatabase:
         """
         # Ensure at least the first requested year is available
         if years:
-            for yr in years:
-                self._ensure_tier3_year(yr)
+            self._ensure_tier3_years(years)
             self._register_tier3_view()
-        elif self.tier3_dir.exists() and not list(self.tier3_dir.glob("trade_*.parquet")):
+        elif not self._tier3_files:
             # No year files downloaded yet — nothing to query
             return []
 
-        view = "tier3"
-
-        where_parts = []
-        if chapter and chapter != "All":
-            where_parts.append(f"hs_chapter = '{chapter}'")
-        if heading and heading != "All":
-            where_parts.append(f"hs_heading = '{heading}'")
-        if years:
-            year_list = ", ".join(str(y) for y in years)
-            where_parts.append(f"year IN ({year_list})")
-
-        where_clause = " AND ".join(where_parts) if where_parts else "1=1"
+        chapter_param = chapter if chapter and chapter != "All" else None
+        heading_param = heading if heading and heading != "All" else None
+        years_param = [int(y) for y in years] if years else None
 
         try:
-            return self.conn.execute(f"""
+            return self._fetch_records("""
                 SELECT DISTINCT hs_code, commodity
-                FROM {view}
-                WHERE {where_clause} AND hs_code IS NOT NULL
+                FROM tier3
+                WHERE hs_code IS NOT NULL
+                  AND (?::VARCHAR   IS NULL OR hs_chapter = ?)
+                  AND (?::VARCHAR   IS NULL OR hs_heading = ?)
+                  AND (?::INTEGER[] IS NULL OR list_contains(?::INTEGER[], year))
                 ORDER BY hs_code
                 LIMIT 1000
-            """).df().to_dict("records")
+            """, [
+                chapter_param, chapter_param,
+                heading_param, heading_param,
+                years_param, years_param,
+            ])
         except Exception:
             return []
 
@@ -599,150 +992,333 @@ class TradeDatabase:
 
     def _build_where_clause(
         self, filters: Dict[str, Any], table_alias: str = ""
-    ) -> List[str]:
+    ) -> Tuple[List[str], List[Any]]:
         """
         Build WHERE clause components from filters.
 
+        Filter values are never inlined into the SQL text — each fragment
+        carries a ``?`` placeholder and its value is appended to *params* in
+        the same order, so one filter shape always yields the same query
+        text for DuckDB to bind against.
+
         Args:
             filters:     Dictionary of filter values
             table_alias: Optional prefix (e.g. 't1.') for column references
 
         Returns:
-            List of WHERE clause string fragments
+            (where_parts, params) — clause fragments and their bound values
         """
         where_parts = []
+        params: List[Any] = []
         
         # Date range
         if 'start_date' in filters:
-            where_parts.append(f"date >= '{filters['start_date']}'")
+            where_parts.append("date >= ?")
+            params.append(filters['start_date'])
         if 'end_date' in filters:
-            where_parts.append(f"date <= '{filters['end_date']}'")
+            where_parts.append("date <= ?")
+            params.append(filters['end_date'])
         
         # Trade type
         if filters.get('trade_type') != 'All' and 'trade_type' in filters:
-            where_parts.append(f"trade_type = '{filters['trade_type']}'")
+            where_parts.append("trade_type = ?")
+            params.append(filters['trade_type'])
         
         # Province
         if filters.get('province') != 'All' and 'province' in filters:
-            where_parts.append(f"province = '{filters['province']}'")
+            where_parts.append("province = ?")
+            params.append(filters['province'])
         
         # HS Chapter
         if filters.get('hs_chapter') != 'All' and 'hs_chapter' in filters:
-            where_parts.append(f"hs_chapter = '{filters['hs_chapter']}'")
+            where_parts.append("hs_chapter = ?")
+            params.append(filters['hs_chapter'])
         
         # HS Heading
         if filters.get('hs_heading') != 'All' and 'hs_heading' in filters:
-            where_parts.append(f"hs_heading = '{filters['hs_heading']}'")
+            where_parts.append("hs_heading = ?")
+            params.append(filters['hs_heading'])
         
         # HS Commodity (full 8-digit code)
         if filters.get('hs_commodity') != 'All' and 'hs_commodity' in filters:
-            where_parts.append(f"hs_code = '{filters['hs_commodity']}'")
+            where_parts.append("hs_code = ?")
+            params.append(filters['hs_commodity'])
         
         # Destination Country
         if filters.get('destination') != 'All' and 'destination' in filters:
-            where_parts.append(f"destination = '{filters['destination']}'")
+            where_parts.append("destination = ?")
+            params.append(filters['destination'])
         
-        # Exclude USA filter (raw parquet value is "USA - United States of America")
+        # Exclude USA filter — precomputed boolean on tier1/tier2, so no
+        # string comparison runs per row. Raw value is "USA - United States of
+        # America"; is_usa is NULL for a NULL destination, so those rows are
+        # dropped, as with the former destination NOT LIKE 'USA - %'
         if filters.get('exclude_usa') == True:
-            where_parts.append("destination NOT LIKE 'USA - %'")
+            where_parts.append("NOT is_usa")
         
         # Default to TRUE if no filters (return all data)
         if not where_parts:
             where_parts.append('1=1')
         
-        return where_parts
+        return where_parts, params
     
-    def query_concentration_metrics(self, filters: Dict[str, Any]) -> Dict[str, Any]:
+    # ────────────────────────────────────────────────────────────────────────
+    # Dashboard stats — Tier 1 routed (headings → Tier 2)
+    # ────────────────────────────────────────────────────────────────────────
+
+    def query_dashboard_stats(self, filters: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Calculate market and product concentration risk using Tier 1.
+        Get KPI, time series and top-N panels for the main dashboard.
+
+        All Tier 1 panels are computed in one statement: the filtered rows
+        are materialized once in a CTE and each panel aggregates over that
+        CTE, so the Parquet scan and filter run a single time regardless of
+        how many panels are built.
 
         Returns:
-            {market_concentration, product_concentration, dependency_matrix}
+            {kpi: {total_value, total_records, avg_monthly},
+             time_series:      [{month, value}, …],
+             top_destinations: [{destination, destination_name, value}, …],
+             top_provinces:    [{province, value}, …],
+             top_hs_codes:     [{code, description, chapter_summary,
+                                 category, category_color, value}, …],
+             top_hs_headings:  [{code, description, value}, …]}  # chapter selected
         """
-        where_parts = self._build_where_clause(filters)
-        where_clause = " AND ".join(where_parts)
-
-        # Tier 1 clause — strip hs_heading (not a Tier 1 column)
-        tier1_filters = {k: v for k, v in filters.items() if k != "hs_heading"}
-        tier1_where_parts = self._build_where_clause(tier1_filters)
+        # Tier 1 clause — strip heading/commodity (not Tier 1 columns)
+        tier1_filters = {
+            k: v for k, v in filters.items() if k not in _TIER1_UNFILTERED_KEYS
+        }
+        tier1_where_parts, params = self._build_where_clause(tier1_filters)
         where_clause = " AND ".join(tier1_where_parts)
 
-        # Market concentration
-        market_data = self.conn.execute(f"""
-            WITH totals AS (
-                SELECT destination, destination_name, SUM(value) AS value
+        # Heading breakdown within the selected chapter — Tier 2, folded into
+        # the same statement (its placeholders follow Tier 1's in the text)
+        chapter_selected = filters.get("hs_chapter", "All") not in ("All", None, "")
+        if chapter_selected:
+            self._ensure_tier2()
+            # Tier 2 clause — strip hs_commodity (not a Tier 2 column)
+            tier2_filters = {
+                k: v for k, v in filters.items() if k not in _TIER2_UNFILTERED_KEYS
+            }
+            tier2_where_parts, tier2_params = self._build_where_clause(tier2_filters)
+            params = params + tier2_params
+            headings_sql = f"""
+                (SELECT list(struct_pack(code        := code,
+                                         description := description,
+                                         value       := value)
+                             ORDER BY value DESC)
+                 FROM (
+                    SELECT
+                        hs_heading   AS code,
+                        heading_name AS description,
+                        SUM(value)   AS value
+                    FROM tier2
+                    WHERE {" AND ".join(tier2_where_parts)}
+                        AND hs_heading IS NOT NULL
+                    GROUP BY hs_heading, heading_name
+                    ORDER BY value DESC
+                    LIMIT 20
+                 ))"""
+        else:
+            headings_sql = "NULL"
+
+        (
+            total_value, total_records,
+            time_series, top_destinations, top_provinces, top_hs_codes,
+            top_hs_headings,
+        ) = self._cursor().execute(f"""
+            WITH f AS MATERIALIZED (
+                SELECT
+                    date, province, destination, destination_name,
+                    hs_chapter, chapter_name, chapter_summary,
+                    category, category_color, value, record_count
                 FROM tier1
                 WHERE {where_clause}
-                GROUP BY destination, destination_name
-            ),
-            grand AS (SELECT SUM(value) AS total FROM totals)
+            )
             SELECT
-                destination,
-                destination_name,
-                value,
-                ROUND(100.0 * value / grand.total, 2) AS pct
-            FROM totals, grand
-            ORDER BY value DESC
-            LIMIT 10
-        """).df().to_dict("records")
+                (SELECT SUM(value)        FROM f) AS total_value,
+                (SELECT SUM(record_count) FROM f) AS total_records,
+                (SELECT list(struct_pack(month := month, value := value)
+                             ORDER BY month)
+                 FROM (
+                    SELECT date_trunc('month', date)::DATE AS month,
+                           SUM(value) AS value
+                    FROM f
+                    GROUP BY 1
+                 )) AS time_series,
+                (SELECT list(struct_pack(destination      := destination,
+                                         destination_name := destination_name,
+                                         value            := value)
+                             ORDER BY value DESC)
+                 FROM (
+                    SELECT destination, destination_name, SUM(value) AS value
+                    FROM f
+                    WHERE destination IS NOT NULL
+                    GROUP BY destination, destination_name
+                    ORDER BY value DESC
+                    LIMIT 10
+                 )) AS top_destinations,
+                (SELECT list(struct_pack(province := province, value := value)
+                             ORDER BY value DESC)
+                 FROM (
+                    SELECT province, SUM(value) AS value
+                    FROM f
+                    WHERE province != 'Canada (Total)'
+                    GROUP BY province
+                    ORDER BY value DESC
+                    LIMIT 15
+                 )) AS top_provinces,
+                (SELECT list(struct_pack(code            := hs_chapter,
+                                         description     := chapter_name,
+                                         chapter_summary := chapter_summary,
+                                         category        := category,
+                                         category_color  := category_color,
+                                         value           := value)
+                             ORDER BY value DESC)
+                 FROM (
+                    SELECT hs_chapter, chapter_name, chapter_summary,
+                           category, category_color, SUM(value) AS value
+                    FROM f
+                    WHERE hs_chapter IS NOT NULL
+                    GROUP BY hs_chapter, chapter_name, chapter_summary,
+                             category, category_color
+                    ORDER BY value DESC
+                    LIMIT 20
+                 )) AS top_hs_codes,
+                {headings_sql} AS top_hs_headings
+        """, params).fetchone()
+
+        total_value = total_value or 0
+        time_series = time_series or []
+        # One time-series point per month with data — no separate
+        # COUNT(DISTINCT month) aggregate needed for the average
+        result = {
+            "kpi": {
+                "total_value":   total_value,
+                "total_records": total_records or 0,
+                "avg_monthly":   total_value / len(time_series) if time_series else 0,
+            },
+            "time_series":      time_series,
+            "top_destinations": top_destinations or [],
+            "top_provinces":    top_provinces or [],
+            "top_hs_codes":     top_hs_codes or [],
+        }
+        if chapter_selected:
+            result["top_hs_headings"] = top_hs_headings or []
 
-        top1_market = market_data[0]["pct"] if market_data else 0
-        top3_market = sum(d["pct"] for d in market_data[:3])
-        top5_market = sum(d["pct"] for d in market_data[:5])
+        return result
 
-        # Product concentration
-        product_data = self.conn.execute(f"""
-            WITH totals AS (
-                SELECT hs_chapter, chapter_name, chapter_summary,
-                       category, category_color, SUM(value) AS value
-                FROM tier1
-                WHERE {where_clause} AND hs_chapter IS NOT NULL
-                GROUP BY hs_chapter, chapter_name, chapter_summary, category, category_color
-            ),
-            grand AS (SELECT SUM(value) AS total FROM totals)
-            SELECT
-                hs_chapter,
-                chapter_name AS chapter,
-                chapter_summary,
-                category,
-                category_color,
-                value,
-                ROUND(100.0 * value / grand.total, 2) AS pct
-            FROM totals, grand
-            ORDER BY value DESC
-            LIMIT 10
-        """).df().to_dict("records")
+    def query_concentration_metrics(self, filters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Calculate market and product concentration risk using Tier 1.
 
-        top1_product = product_data[0]["pct"] if product_data else 0
-        top3_product = sum(d["pct"] for d in product_data[:3])
-        top5_product = sum(d["pct"] for d in product_data[:5])
+        Returns:
+            {market_concentration, product_concentration, dependency_matrix}
+        """
+        # Tier 1 clause — strip heading/commodity (not Tier 1 columns)
+        tier1_filters = {
+            k: v for k, v in filters.items() if k not in _TIER1_UNFILTERED_KEYS
+        }
+        tier1_where_parts, params = self._build_where_clause(tier1_filters)
+        where_clause = " AND ".join(tier1_where_parts)
 
         # Dependency matrix (Province × Country) — only without province filter
-        dependency_matrix = []
         if filters.get("province", "All") in ("All", None, ""):
-            dependency_matrix = self.conn.execute(f"""
-                WITH pc AS (
+            dependency_sql = """
+                (SELECT list(struct_pack(province              := pc.province,
+                                         destination           := pc.destination,
+                                         destination_name      := pc.destination_name,
+                                         value                 := pc.value,
+                                         pct_of_province_total := ROUND(100.0 * pc.value / pt.total, 2))
+                             ORDER BY pc.province, pc.value DESC)
+                 FROM (
                     SELECT province, destination, destination_name, SUM(value) AS value
-                    FROM tier1
-                    WHERE {where_clause} AND province != 'Canada (Total)'
+                    FROM f
+                    WHERE province != 'Canada (Total)'
                     GROUP BY province, destination, destination_name
-                ),
-                pt AS (
+                 ) pc
+                 JOIN (
                     SELECT province, SUM(value) AS total
-                    FROM pc
+                    FROM f
+                    WHERE province != 'Canada (Total)'
                     GROUP BY province
-                )
+                 ) pt ON pc.province = pt.province
+                 WHERE pc.value > 0)"""
+        else:
+            dependency_sql = "NULL"
+
+        # Market, product and dependency panels share one filtered scan
+        market_data, product_data, dependency_matrix = self._cursor().execute(f"""
+            WITH f AS MATERIALIZED (
                 SELECT
-                    pc.province,
-                    pc.destination,
-                    pc.destination_name,
-                    pc.value,
-                    ROUND(100.0 * pc.value / pt.total, 2) AS pct_of_province_total
-                FROM pc
-                JOIN pt ON pc.province = pt.province
-                WHERE pc.value > 0
-                ORDER BY pc.province, pc.value DESC
-            """).df().to_dict("records")
+                    province, destination, destination_name,
+                    hs_chapter, chapter_name, chapter_summary,
+                    category, category_color, value
+                FROM tier1
+                WHERE {where_clause}
+            )
+            SELECT
+                (SELECT list(struct_pack(destination      := destination,
+                                         destination_name := destination_name,
+                                         value            := value,
+                                         pct              := pct)
+                             ORDER BY value DESC)
+                 FROM (
+                    SELECT
+                        destination,
+                        destination_name,
+                        value,
+                        ROUND(100.0 * value / SUM(value) OVER (), 2) AS pct
+                    FROM (
+                        SELECT destination, destination_name, SUM(value) AS value
+                        FROM f
+                        GROUP BY destination, destination_name
+                    )
+                    ORDER BY value DESC
+                    LIMIT 10
+                 )) AS market_data,
+                (SELECT list(struct_pack(hs_chapter      := hs_chapter,
+                                         chapter         := chapter,
+                                         chapter_summary := chapter_summary,
+                                         category        := category,
+                                         category_color  := category_color,
+                                         value           := value,
+                                         pct             := pct)
+                             ORDER BY value DESC)
+                 FROM (
+                    SELECT
+                        hs_chapter,
+                        chapter_name AS chapter,
+                        chapter_summary,
+                        category,
+                        category_color,
+                        value,
+                        ROUND(100.0 * value / SUM(value) OVER (), 2) AS pct
+                    FROM (
+                        SELECT hs_chapter, chapter_name, chapter_summary,
+                               category, category_color, SUM(value) AS value
+                        FROM f
+                        WHERE hs_chapter IS NOT NULL
+                        GROUP BY hs_chapter, chapter_name, chapter_summary,
+                                 category, category_color
+                    )
+                    ORDER BY value DESC
+                    LIMIT 10
+                 )) AS product_data,
+                {dependency_sql} AS dependency_matrix
+        """, params).fetchone()
+
+        market_data = market_data or []
+        product_data = product_data or []
+        dependency_matrix = dependency_matrix or []
+
+        top1_market = market_data[0]["pct"] if market_data else 0
+        top3_market = sum(d["pct"] for d in market_data[:3])
+        top5_market = sum(d["pct"] for d in market_data[:5])
+
+        top1_product = product_data[0]["pct"] if product_data else 0
+        top3_product = sum(d["pct"] for d in product_data[:3])
+        top5_product = sum(d["pct"] for d in product_data[:5])
 
         return {
             "market_concentration": {
@@ -779,13 +1355,14 @@ class TradeDatabase:
                         hs_chapter, chapter_name, chapter_summary,
                         category, category_color, value}, …]}
         """
-        where_parts = self._build_where_clause(filters)
-        # Tier 1 clause — strip hs_heading (not a Tier 1 column)
-        tier1_filters = {k: v for k, v in filters.items() if k != "hs_heading"}
-        tier1_where_parts = self._build_where_clause(tier1_filters)
+        # Tier 1 clause — strip heading/commodity (not Tier 1 columns)
+        tier1_filters = {
+            k: v for k, v in filters.items() if k not in _TIER1_UNFILTERED_KEYS
+        }
+        tier1_where_parts, params = self._build_where_clause(tier1_filters)
         where_clause = " AND ".join(tier1_where_parts)
 
-        flows = self.conn.execute(f"""
+        flows = self._fetch_records(f"""
             SELECT
                 province,
                 destination,
@@ -806,76 +1383,84 @@ class TradeDatabase:
             HAVING SUM(value) > 0
             ORDER BY value DESC
             LIMIT 200
-        """).df()
+        """, params)
 
-        return {"flows": flows.to_dict("records")}
+        return {"flows": flows}
 
     # ────────────────────────────────────────────────────────────────────────
     # Province comparison — Tier 1 routed
     # ────────────────────────────────────────────────────────────────────────
 
     def query_province_comparison_metrics(
-        self, filters: Dict[str, Any]
+        self, filters: Dict[str, Any], exact: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Get per-province summary metrics (ignores province filter).
 
+        num_countries / num_chapters count the already-grouped rows, which
+        hold one entry per destination / chapter, so no DISTINCT hash set is
+        built. Pass exact=True to force COUNT(DISTINCT …) regardless.
+
         Returns:
             [{province, total_value, num_countries, num_chapters,
               top_destination, top_destination_name, top_chapter}, …]
         """
         filters_copy = {**filters, "province": "All"}
-        where_parts = self._build_where_clause(filters_copy)
-        # Tier 1 clause — strip hs_heading (not a Tier 1 column)
-        tier1_filters = {k: v for k, v in filters_copy.items() if k != "hs_heading"}
-        tier1_where_parts = self._build_where_clause(tier1_filters)
+        # Tier 1 clause — strip heading/commodity (not Tier 1 columns)
+        tier1_filters = {
+            k: v for k, v in filters_copy.items() if k not in _TIER1_UNFILTERED_KEYS
+        }
+        tier1_where_parts, params = self._build_where_clause(tier1_filters)
         where_clause = " AND ".join(tier1_where_parts)
+        distinct_count = "COUNT(DISTINCT {})" if exact else "COUNT({})"
 
-        return self.conn.execute(f"""
-            WITH stats AS (
-                SELECT
-                    province,
-                    SUM(value)                  AS total_value,
-                    COUNT(DISTINCT destination)  AS num_countries,
-                    COUNT(DISTINCT hs_chapter)   AS num_chapters
-                FROM tier1
-                WHERE {where_clause} AND province != 'Canada (Total)'
-                GROUP BY province
-            ),
-            top_dest AS (
+        # One scan of tier1: GROUPING SETS yields both the per-destination
+        # and the per-chapter totals, and arg_max picks each province's top
+        # entry from them — no window functions or self-joins.
+        return self._fetch_records(f"""
+            WITH g AS (
                 SELECT
                     province,
                     destination,
                     destination_name,
-                    ROW_NUMBER() OVER (PARTITION BY province ORDER BY SUM(value) DESC) AS rn
+                    hs_chapter,
+                    chapter_name,
+                    GROUPING(hs_chapter, chapter_name) = 0 AS by_chapter,
+                    SUM(value) AS value
                 FROM tier1
                 WHERE {where_clause} AND province != 'Canada (Total)'
-                GROUP BY province, destination, destination_name
+                GROUP BY GROUPING SETS (
+                    (province, destination, destination_name),
+                    (province, hs_chapter, chapter_name)
+                )
             ),
-            top_ch AS (
+            per_province AS (
                 SELECT
                     province,
-                    hs_chapter || ' - ' || chapter_name AS top_chapter,
-                    ROW_NUMBER() OVER (PARTITION BY province ORDER BY SUM(value) DESC) AS rn
-                FROM tier1
-                WHERE {where_clause}
-                    AND province != 'Canada (Total)'
-                    AND hs_chapter IS NOT NULL
-                GROUP BY province, hs_chapter, chapter_name
+                    SUM(value) FILTER (WHERE NOT by_chapter)                  AS total_value,
+                    {distinct_count.format("destination")} FILTER (WHERE NOT by_chapter) AS num_countries,
+                    {distinct_count.format("hs_chapter")} FILTER (WHERE by_chapter)      AS num_chapters,
+                    arg_max(
+                        struct_pack(destination := destination,
+                                    destination_name := destination_name),
+                        value
+                    ) FILTER (WHERE NOT by_chapter)                           AS top_dest,
+                    arg_max(hs_chapter || ' - ' || chapter_name, value)
+                        FILTER (WHERE by_chapter AND hs_chapter IS NOT NULL)  AS top_chapter
+                FROM g
+                GROUP BY province
             )
             SELECT
-                s.province,
-                s.total_value,
-                s.num_countries,
-                s.num_chapters,
-                td.destination       AS top_destination,
-                td.destination_name  AS top_destination_name,
-                tc.top_chapter
-            FROM stats s
-            LEFT JOIN top_dest td ON s.province = td.province AND td.rn = 1
-            LEFT JOIN top_ch   tc ON s.province = tc.province AND tc.rn  = 1
-            ORDER BY s.total_value DESC
-        """).df().to_dict("records")
+                province,
+                total_value,
+                num_countries,
+                num_chapters,
+                top_dest.destination       AS top_destination,
+                top_dest.destination_name  AS top_destination_name,
+                top_chapter
+            FROM per_province
+            ORDER BY total_value DESC
+        """, params)
 
     # ────────────────────────────────────────────────────────────────────────
     # Utility
@@ -63,6 +63,15 @@ CATEGORY_MAP = {
     '98-99': ('📋 Special Provisions', '#808080')
 }
 
+# Chapter number → (category_name, color_hex), expanded once from the ranges
+# above so get_category is a single dict lookup
+_CATEGORY_BY_CHAPTER = {
+    code_num: category
+    for range_key, category in reversed(list(CATEGORY_MAP.items()))
+    for code_num in range(int(range_key.split('-')[0]),
+                          int(range_key.split('-')[1]) + 1)
+}
+
 
 def get_chapter_summary(chapter_code):
     """
@@ -88,11 +97,7 @@ def get_category(chapter_code):
         tuple: (category_name, color_hex) or ('Other', '#CCCCCC') if not found
     """
     try:
-        code_num = int(chapter_code)
-        for range_key, (category, color) in CATEGORY_MAP.items():
-            start, end = map(int, range_key.split('-'))
-            if start <= code_num <= end:
-                return category, color
+        return _CATEGORY_BY_CHAPTER.get(int(chapter_code), ('Other', '#CCCCCC'))
     except (ValueError, AttributeError):
         pass
     return 'Other', '#CCCCCC'
@@ -7,16 +7,25 @@ and converts them into optimized Parquet files for use with DuckDB.
 
 Output:
 - data/processed/trade_records.parquet - Main trade data
+- data/processed/trade_records/ - Same data, Hive-partitioned by trade_type/year
 - data/processed/hs_lookup.parquet - HS code hierarchy lookup
 - data/processed/metadata.json - Processing metadata
 """
 
 import os
 import json
+import shutil
 import pandas as pd
+import pyarrow as pa
 from pathlib import Path
 from datetime import datetime
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import orjson  # optional: C JSON decoder, several times faster than json
+except ImportError:
+    orjson = None
 
 # Add parent directory to path to import from extract_trade_data
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -26,104 +35,147 @@ from extract_trade_data import process_data, CHAPTER_MAP, HEADING_MAP, COMMODITY
 RAW_DATA_DIR = "data/raw"
 PROCESSED_DIR = "data/processed"
 OUTPUT_FILE = os.path.join(PROCESSED_DIR, "trade_records.parquet")
+PARTITIONED_DIR = os.path.join(PROCESSED_DIR, "trade_records")
+PARTITION_COLS = ['trade_type', 'year']
+# Rows are clustered on the dashboard's hot filter columns so each row
+# group covers a narrow min/max range and DuckDB can skip the rest
+SORT_COLS = ['trade_type', 'year', 'province', 'hs_chapter', 'date']
+ROW_GROUP_SIZE = 100_000
+# ZSTD at a low level: smaller files than Snappy at similar decode speed
+COMPRESSION = 'zstd'
+COMPRESSION_LEVEL = 3
 HS_LOOKUP_FILE = os.path.join(PROCESSED_DIR, "hs_lookup.parquet")
 METADATA_FILE = os.path.join(PROCESSED_DIR, "metadata.json")
 
 
+def read_json_file(file_path):
+    """Parse a JSON file, using orjson when installed."""
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    return orjson.loads(content) if orjson else json.loads(content)
+
+
+def process_raw_file(file_path):
+    """
+    Load one raw JSON file and return its filtered records.
+    
+    Runs in a worker process, so it must stay a top-level function.
+    Trade type is left as process_data sets it; imports are relabelled
+    column-wise in normalize_records.
+    
+    Args:
+        file_path: Path to a "{month:02d}_{prov_id}.json" file
+    
+    Returns:
+        (file_path, rows, error) - error is None on success
+    """
+    try:
+        # Parse filename for province ID (format: "{month:02d}_{prov_id}.json")
+        stem = os.path.basename(file_path)
+        if stem.endswith('.json'):
+            stem = stem[:-5]
+        _, sep, prov_part = stem.partition('_')
+        prov_id = int(prov_part) if sep else None
+        
+        # Load and process raw data
+        raw_data = read_json_file(file_path)
+        
+        # Process data using existing enrichment logic
+        rows = process_data(raw_data, current_prov_id=prov_id)
+        
+        # Apply filter logic (same as extract script): the Canada total
+        # excludes the US, which is handled separately by the provinces
+        if prov_id == 0:
+            rows = [row for row in rows if str(row.get('CountryCode')) != '9']
+        
+        return file_path, rows, None
+    
+    except Exception as e:
+        return file_path, [], str(e)
+
+
 def process_all_raw_files():
     """
     Process all raw JSON files from data/raw/ directory.
     
+    Files are parsed in parallel across CPU cores; results are collected
+    in directory-walk order, so the output is deterministic.
+    
     Returns:
-        List of processed records
+        (export_rows, import_rows) - lists of processed records
     """
     print(f"🔍 Scanning raw data in {RAW_DATA_DIR} and data/raw_imports...")
-    all_rows = []
+    export_rows = []
+    import_rows = []
     file_count = 0
     error_count = 0
     
     # Process both exports and imports directories
     dirs_to_process = [RAW_DATA_DIR, "data/raw_imports"]
     
+    file_paths = []
+    import_flags = []
     for process_dir in dirs_to_process:
         if not os.path.exists(process_dir):
             print(f"   ⚠️  Directory {process_dir} does not exist, skipping...")
             continue
-            
+        
+        # Determine Trade Type based on directory
+        is_import = "raw_imports" in process_dir
+        
         # Walk through Year/Chapter directories
         for root, dirs, files in os.walk(process_dir):
             for file in files:
                 if file.endswith(".json"):
-                    try:
-                        # Determine Trade Type based on directory
-                        is_import = "raw_imports" in process_dir
-                        current_trade_type = "Import" if is_import else "Export"
-                        
-                        # Parse filename for province ID (format: "{month:02d}_{prov_id}.json")
-                        parts = file.replace('.json', '').split('_')
-                        if len(parts) >= 2:
-                            prov_id = int(parts[1])
-                        else:
-                            prov_id = None
-                        
-                        # Load and process raw data
-                        file_path = os.path.join(root, file)
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            raw_data = json.load(f)
-                    
-                        # Process data using existing enrichment logic
-                        rows = process_data(raw_data, current_prov_id=prov_id)
-                        
-                        # Post-process: Override TradeType if Import
-                        # (Because process_data defaults to Export)
-                        if is_import:
-                            for row in rows:
-                                row['TradeType'] = 'Import'
-                        
-                        # Apply filter logic (same as extract script)
-                        valid_rows = []
-                        for row in rows:
-                            is_us = (str(row.get('CountryCode')) == '9')
-                            if prov_id == 0:
-                                # Canada Total: exclude US (handled separately by provinces)
-                                if not is_us:
-                                    valid_rows.append(row)
-                            else:
-                                # Provincial data: include all
-                                valid_rows.append(row)
-                        
-                        all_rows.extend(valid_rows)
-                        file_count += 1
-                        
-                        if file_count % 50 == 0:
-                            print(f"   ✓ Processed {file_count} files, {len(all_rows):,} records...", flush=True)
-                    
-                    except Exception as e:
-                        error_count += 1
-                        print(f"   ⚠️  Error processing {file}: {e}")
+                    file_paths.append(os.path.join(root, file))
+                    import_flags.append(is_import)
+    
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = executor.map(process_raw_file, file_paths, chunksize=32)
+        for (file_path, rows, error), is_import in zip(results, import_flags):
+            if error is not None:
+                error_count += 1
+                print(f"   ⚠️  Error processing {os.path.basename(file_path)}: {error}")
+                continue
+            
+            (import_rows if is_import else export_rows).extend(rows)
+            file_count += 1
+            
+            if file_count % 50 == 0:
+                total = len(export_rows) + len(import_rows)
+                print(f"   ✓ Processed {file_count} files, {total:,} records...", flush=True)
     
     print(f"\n✅ Processed {file_count} files successfully")
     if error_count > 0:
         print(f"⚠️  {error_count} files had errors")
-    print(f"📊 Total records: {len(all_rows):,}")
+    print(f"📊 Total records: {len(export_rows) + len(import_rows):,}")
     
-    return all_rows
+    return export_rows, import_rows
 
 
-def normalize_records(records):
+def normalize_records(export_records, import_records):
     """
     Normalize record structure for Parquet conversion.
     
     Args:
-        records: List of raw processed records
+        export_records: List of raw processed records from data/raw/
+        import_records: List of raw processed records from data/raw_imports/
     
     Returns:
         pandas DataFrame with normalized schema
     """
     print("\n🔄 Normalizing record structure...")
     
-    # Convert to DataFrame
-    df = pd.DataFrame(records)
+    # Convert to DataFrame; process_data labels every row as an export, so
+    # the import frame is relabelled with one column assignment
+    frames = []
+    if export_records:
+        frames.append(pd.DataFrame(export_records))
+    if import_records:
+        imports_df = pd.DataFrame(import_records)
+        imports_df['TradeType'] = 'Import'
+        frames.append(imports_df)
+    df = pd.concat(frames, ignore_index=True)
     
     # Rename and normalize columns
     column_mapping = {
@@ -147,8 +199,10 @@ def normalize_records(records):
     # Rename columns that exist
     df = df.rename(columns={k: v for k, v in column_mapping.items() if k in df.columns})
     
-    # Extract HS code components (chapter, heading)
+    # Extract HS code components (chapter, heading) — on an Arrow-backed
+    # string column the slices run as Arrow compute kernels, not per-row Python
     if 'hs_code' in df.columns:
+        df['hs_code'] = df['hs_code'].astype('string[pyarrow]')
         df['hs_chapter'] = df['hs_code'].str[:2]
         df['hs_heading'] = df['hs_code'].str[:4]
     
@@ -164,8 +218,26 @@ def normalize_records(records):
     
     # Add year and month columns for easier filtering
     if 'date' in df.columns:
-        df['year'] = df['date'].dt.year
-        df['month'] = df['date'].dt.month
+        df['year'] = df['date'].dt.year.astype('Int16')
+        df['month'] = df['date'].dt.month.astype('Int8')
+        # Dates are whole days: store as Arrow date32 (4 bytes) rather than
+        # letting pandas write datetime64[ns] as an 8-byte timestamp
+        df['date'] = df['date'].astype(pd.ArrowDtype(pa.date32()))
+    
+    # Downcast small integer IDs (int64 by default) to halve/quarter their
+    # scan width; value stays float64 — trade totals need > 7 digits
+    if 'province_code' in df.columns:
+        df['province_code'] = pd.to_numeric(df['province_code'], errors='coerce').astype('Int16')
+    
+    # Low-cardinality text as pandas categoricals: one copy of each distinct
+    # string instead of a Python object per row (hs_code stays plain text)
+    category_columns = [
+        'trade_type', 'province', 'destination', 'destination_iso',
+        'destination_state', 'hs_chapter', 'hs_heading', 'uom'
+    ]
+    for col in category_columns:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
     
     # Select and order final columns
     final_columns = [
@@ -181,6 +253,11 @@ def normalize_records(records):
     # Include only columns that exist
     df = df[[col for col in final_columns if col in df.columns]]
     
+    # Cluster rows for row-group pruning (see SORT_COLS)
+    df = df.sort_values(
+        [col for col in SORT_COLS if col in df.columns], ignore_index=True
+    )
+    
     print(f"   ✓ Normalized {len(df):,} records")
     print(f"   ✓ Date range: {df['date'].min()} to {df['date'].max()}")
     print(f"   ✓ Columns: {', '.join(df.columns)}")
@@ -197,39 +274,38 @@ def create_hs_lookup():
     """
     print("\n🏗️  Creating HS code lookup table...")
     
-    hs_data = []
+    # Built column-wise: one list per column instead of one dict per code
+    columns = {
+        'hs_level': [], 'hs_code': [], 'hs_chapter': [],
+        'description': [], 'hs_heading': [], 'uom': []
+    }
+    
+    def add(hs_level, hs_code, hs_chapter, description, hs_heading=None, uom=None):
+        columns['hs_level'].append(hs_level)
+        columns['hs_code'].append(hs_code)
+        columns['hs_chapter'].append(hs_chapter)
+        columns['description'].append(description)
+        columns['hs_heading'].append(hs_heading)
+        columns['uom'].append(uom)
     
     # Chapters (2-digit)
     for code, desc in CHAPTER_MAP.items():
-        hs_data.append({
-            'hs_level': 'chapter',
-            'hs_code': code,
-            'hs_chapter': code,
-            'description': desc
-        })
+        add('chapter', code, code, desc)
     
     # Headings (4-digit)
     for code, desc in HEADING_MAP.items():
-        hs_data.append({
-            'hs_level': 'heading',
-            'hs_code': code,
-            'hs_chapter': code[:2] if len(code) >= 2 else code,
-            'hs_heading': code,
-            'description': desc
-        })
+        add('heading', code, code[:2] if len(code) >= 2 else code, desc,
+            hs_heading=code)
     
     # Commodities (8-digit)
     for code, info in COMMODITY_MAP.items():
-        hs_data.append({
-            'hs_level': 'commodity',
-            'hs_code': code,
-            'hs_chapter': code[:2] if len(code) >= 2 else code,
-            'hs_heading': code[:4] if len(code) >= 4 else code,
-            'description': info.get('EN', code),
-            'uom': info.get('UOM')
-        })
+        add('commodity', code, code[:2] if len(code) >= 2 else code,
+            info.get('EN', code),
+            hs_heading=code[:4] if len(code) >= 4 else code,
+            uom=info.get('UOM'))
     
-    df = pd.DataFrame(hs_data)
+    df = pd.DataFrame(columns)
+    df['hs_level'] = df['hs_level'].astype('category')
     
     print(f"   ✓ Created lookup with {len(df):,} HS codes")
     print(f"   ✓ Chapters: {len(CHAPTER_MAP)}, Headings: {len(HEADING_MAP)}, Commodities: {len(COMMODITY_MAP)}")
@@ -251,12 +327,14 @@ def save_to_parquet(df, output_path, description):
     # Ensure output directory exists
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     
-    # Save with Snappy compression (good balance of speed and size)
+    # Save with ZSTD compression (good balance of speed and size)
     df.to_parquet(
         output_path,
         engine='pyarrow',
-        compression='snappy',
-        index=False
+        compression=COMPRESSION,
+        compression_level=COMPRESSION_LEVEL,
+        index=False,
+        row_group_size=ROW_GROUP_SIZE
     )
     
     # Get file size
@@ -267,6 +345,40 @@ def save_to_parquet(df, output_path, description):
     print(f"   ✓ File size: {file_size_mb:.2f} MB")
 
 
+def save_partitioned_parquet(df, output_dir, partition_cols):
+    """
+    Save DataFrame as a Hive-partitioned Parquet dataset.
+
+    Files land in ``<output_dir>/trade_type=Export/year=2023/…`` so DuckDB
+    can prune whole files from the directory names before opening any of
+    them when a query filters on the partition columns.
+    
+    Args:
+        df: pandas DataFrame
+        output_dir: Dataset root directory (replaced if it exists)
+        partition_cols: Columns encoded in the directory layout
+    """
+    print(f"\n💾 Saving partitioned dataset ({', '.join(partition_cols)})...")
+    
+    # Start from a clean directory so stale partitions never linger
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    
+    df.to_parquet(
+        output_dir,
+        engine='pyarrow',
+        compression=COMPRESSION,
+        compression_level=COMPRESSION_LEVEL,
+        index=False,
+        partition_cols=partition_cols,
+        row_group_size=ROW_GROUP_SIZE
+    )
+    
+    file_count = sum(len(files) for _, _, files in os.walk(output_dir))
+    print(f"   ✓ Saved to: {output_dir}/")
+    print(f"   ✓ Files: {file_count}")
+
+
 def save_metadata(total_records, trade_df):
     """
     Save processing metadata.
@@ -284,7 +396,7 @@ def save_metadata(total_records, trade_df):
             'start': str(trade_df['date'].min()),
             'end': str(trade_df['date'].max())
         },
-        'years': sorted(trade_df['year'].unique().tolist()),
+        'years': sorted(trade_df['year'].dropna().unique().tolist()),
         'provinces': sorted(trade_df['province'].unique().tolist()),
         'trade_types': sorted(trade_df['trade_type'].unique().tolist()) if 'trade_type' in trade_df.columns else [],
         'hs_chapters': sorted(trade_df['hs_chapter'].unique().tolist()),
@@ -309,24 +421,28 @@ def main():
     print("=" * 70)
     
     # Step 1: Process all raw JSON files
-    records = process_all_raw_files()
+    export_records, import_records = process_all_raw_files()
+    total_records = len(export_records) + len(import_records)
     
-    if not records:
+    if not total_records:
         print("❌ No records found to process!")
         return
     
-    # Step 2: Normalize records to DataFrame
-    trade_df = normalize_records(records)
+    # Step 2: Normalize records to DataFrame, then drop the row dicts so
+    # only the columnar frame is held through sorting and the writes
+    trade_df = normalize_records(export_records, import_records)
+    del export_records, import_records
     
     # Step 3: Create HS code lookup table
     hs_lookup_df = create_hs_lookup()
     
     # Step 4: Save to Parquet
     save_to_parquet(trade_df, OUTPUT_FILE, "trade records")
+    save_partitioned_parquet(trade_df, PARTITIONED_DIR, PARTITION_COLS)
     save_to_parquet(hs_lookup_df, HS_LOOKUP_FILE, "HS code lookup")
     
     # Step 5: Save metadata
-    save_metadata(len(records), trade_df)
+    save_metadata(total_records, trade_df)
     
     # Summary
     print("\n" + "=" * 70)
@@ -334,10 +450,11 @@ def main():
     print("=" * 70)
     print(f"\n📁 Output files:")
     print(f"   • {OUTPUT_FILE}")
+    print(f"   • {PARTITIONED_DIR}/")
     print(f"   • {HS_LOOKUP_FILE}")
     print(f"   • {METADATA_FILE}")
     print(f"\n📊 Summary:")
-    print(f"   • Records: {len(records):,}")
+    print(f"   • Records: {total_records:,}")
     print(f"   • Date range: {trade_df['date'].min()} to {trade_df['date'].max()}")
     print(f"   • Total value: ${trade_df['value'].sum():,.0f} CAD")
     print(f"\n🚀 Ready for DuckDB and Streamlit dashboard!")
@@ -1,18 +1,26 @@
 import requests
 import json
 import concurrent.futures
+import itertools
 import re
 import os
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import datetime
 
+try:
+    import orjson  # optional: faster JSON parse/serialize for the raw cache
+except ImportError:
+    orjson = None
+
 # --- CONFIGURATION ---
 BASE_URL = "https://www150.statcan.gc.ca/t1/cimt/rest/getReport/"
 OUTPUT_DIR = "src/data"
 YEARS = [2008, 2009, 2010]
 MONTHS = range(1, 13)
 FLOWS = [0, 1] # 0 = Export, 1 = Import
+MAX_WORKERS = 10 # Concurrent requests (lower this if the API rate-limits you)
+MAX_IN_FLIGHT = 4 * MAX_WORKERS # Submitted-but-unfinished tasks kept queued
 
 # --- DATA LOADING ---
 def load_json(path):
@@ -34,7 +42,10 @@ except:
 # --- NETWORKING ---
 session = requests.Session()
 retries = Retry(total=3, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
-session.mount('https://', HTTPAdapter(max_retries=retries))
+# One pooled connection per worker: with the default pool size, workers
+# beyond it would have their connections discarded and pay a fresh TLS
+# handshake per request
+session.mount('https://', HTTPAdapter(max_retries=retries, pool_maxsize=MAX_WORKERS))
 
 def fetch_data(year, month, chapter, prov_id, flow_id):
     # P1: ProvID
@@ -52,33 +63,56 @@ def fetch_data(year, month, chapter, prov_id, flow_id):
     except Exception as e:
         return None
 
-def fetch_task(year, month, chapter, prov_id, flow_id):
+def scan_cache(dirs=("data/raw", "data/raw_imports")):
+    """
+    Collect the raw JSON files already on disk in one directory walk.
+    
+    Files are written atomically (see fetch_task), so any non-empty .json
+    file is complete and needs no re-parse to be trusted.
+    """
+    cached = set()
+    pending = [d for d in dirs if os.path.isdir(d)]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    pending.append(entry.path)
+                elif entry.name.endswith(".json") and entry.stat().st_size > 0:
+                    cached.add(entry.path)
+    return cached
+
+def raw_dir_for(year, chapter, flow_id):
     # Flow 0 = Export -> data/raw/
     # Flow 1 = Import -> data/raw_imports/
     if flow_id == 0:
-        raw_dir = f"data/raw/{year}/{chapter}"
-    else:
-        raw_dir = f"data/raw_imports/{year}/{chapter}"
-    os.makedirs(raw_dir, exist_ok=True)
+        return f"data/raw/{year}/{chapter}"
+    return f"data/raw_imports/{year}/{chapter}"
+
+def fetch_task(year, month, chapter, prov_id, flow_id, cached_files=frozenset()):
+    # Directory is pre-created by main()
+    raw_dir = raw_dir_for(year, chapter, flow_id)
     
     filename = f"{month:02d}_{prov_id}.json"
     filepath = os.path.join(raw_dir, filename)
     
-    # Skip if exists and valid
-    if os.path.exists(filepath):
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = json.load(f)
-                return True # Success (Cached)
-        except:
-            pass # Invalid, re-fetch
+    # Skip if already downloaded (pre-scanned once in main)
+    if filepath in cached_files:
+        return True # Success (Cached)
 
     data = fetch_data(year, month, chapter, prov_id, flow_id)
     
     if data:
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(data, f)
+            # Write to a temp name and rename, so an interrupted run never
+            # leaves a truncated file that the cache scan would trust
+            tmp_path = filepath + ".tmp"
+            if orjson:
+                with open(tmp_path, 'wb') as f:
+                    f.write(orjson.dumps(data))
+            else:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+            os.replace(tmp_path, filepath)
             return True # Success (New)
         except Exception as e:
             print(f"Warning: Failed to save {filepath}: {e}")
@@ -94,24 +128,44 @@ def main():
     print(f"Starting UNIFIED extraction for {total_tasks} tasks (Flows: {FLOWS})...")
     print(f"Years: {YEARS}")
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        futures = []
-        for flow in FLOWS:
-            for year in YEARS:
-                for month in MONTHS:
-                    for chapter in target_chapters:
-                        for pid in targets:
-                            futures.append(executor.submit(fetch_task, year, month, chapter, pid, flow))
+    cached_files = frozenset(scan_cache())
+    print(f"Found {len(cached_files)} previously downloaded files.")
+    
+    # Create every output directory once, not once per task
+    for flow in FLOWS:
+        for year in YEARS:
+            for chapter in target_chapters:
+                os.makedirs(raw_dir_for(year, chapter, flow), exist_ok=True)
+    
+    # Tasks are generated lazily and submitted through a sliding window, so
+    # only MAX_IN_FLIGHT futures exist at a time instead of one per task
+    tasks = (
+        (year, month, chapter, pid, flow)
+        for flow, year, month, chapter, pid
+        in itertools.product(FLOWS, YEARS, MONTHS, target_chapters, targets)
+    )
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        def submit(batch):
+            return {executor.submit(fetch_task, *task, cached_files) for task in batch}
+        
+        in_flight = submit(itertools.islice(tasks, MAX_IN_FLIGHT))
         
         count = 0
         completed = 0
-        for future in concurrent.futures.as_completed(futures):
-            count += 1
-            if future.result():
-                completed += 1
-                
-            if count % 100 == 0:
-                print(f"Progress: {count}/{total_tasks} ({completed} success)...", flush=True)
+        while in_flight:
+            done, in_flight = concurrent.futures.wait(
+                in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                count += 1
+                if future.result():
+                    completed += 1
+                    
+                if count % 100 == 0:
+                    print(f"Progress: {count}/{total_tasks} ({completed} success)...", flush=True)
+            
+            in_flight |= submit(itertools.islice(tasks, len(done)))
             
     print("Done. All requested data extracted.")
 
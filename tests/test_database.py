@@ -0,0 +1,126 @@
+"""
+Tests for TradeDatabase query routing against small local tier files.
+
+Run with:  python -m pytest tests/
+"""
+
+import shutil
+import sys
+from pathlib import Path
+
+import duckdb
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "dashboard_streamlit"))
+
+from database import TradeDatabase  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """TradeDatabase over a tiny Tier 1 + Tier 2 pair (no downloads)."""
+    conn = duckdb.connect()
+    conn.execute("""
+        CREATE TABLE raw AS
+        SELECT
+            (DATE '2023-01-01' + INTERVAL (m) MONTH)::DATE AS date,
+            CAST(2023 + m // 12 AS SMALLINT)               AS year,
+            ['Export', 'Import'][1 + i % 2]                AS trade_type,
+            ['Ontario', 'Quebec'][1 + i % 2]               AS province,
+            ['USA - United States of America', 'CHN - China', NULL][1 + (i + m) % 3]
+                                                           AS destination,
+            lpad((1 + i % 3)::VARCHAR, 2, '0')             AS hs_chapter,
+            lpad((1 + i % 3)::VARCHAR, 2, '0') || '01'     AS hs_heading,
+            (10 * (i + 1))::DOUBLE                         AS value
+        FROM range(0, 12) t(m), range(0, 6) s(i)
+    """)
+    conn.execute(f"""
+        COPY (
+            SELECT
+                date, year, trade_type, province, destination,
+                split_part(destination, ' - ', 2) AS destination_name,
+                split_part(destination, ' - ', 1) AS destination_iso,
+                hs_chapter, 'Chapter ' || hs_chapter AS chapter_name,
+                NULL AS chapter_summary, NULL AS category, NULL AS category_color,
+                SUM(value) AS value, COUNT(*) AS record_count
+            FROM raw GROUP BY ALL
+        ) TO '{tmp_path / "summary_chapter.parquet"}'
+    """)
+    conn.execute(f"""
+        COPY (
+            SELECT
+                date, year, trade_type, province, destination,
+                split_part(destination, ' - ', 2) AS destination_name,
+                hs_chapter, 'Chapter ' || hs_chapter AS chapter_name,
+                hs_heading, 'Heading ' || hs_heading AS heading_name,
+                SUM(value) AS value
+            FROM raw GROUP BY ALL
+        ) TO '{tmp_path / "summary_heading.parquet"}'
+    """)
+    conn.close()
+
+    database = TradeDatabase(str(tmp_path))
+    yield database
+    database.close()
+
+
+FILTERS = {
+    "start_date": "2023-01-01",
+    "end_date": "2023-12-31",
+    "trade_type": "All",
+    "province": "All",
+    "destination": "All",
+    "hs_chapter": "01",
+    "hs_heading": "All",
+    "hs_commodity": "All",
+    "exclude_usa": False,
+}
+
+
+def test_dashboard_stats_with_commodity_selected(db):
+    """A commodity filter must not reach the summary tiers (no hs_code there)."""
+    result = db.query_dashboard_stats({**FILTERS, "hs_commodity": "01010000"})
+    baseline = db.query_dashboard_stats(FILTERS)
+
+    assert result["kpi"]["total_value"] == baseline["kpi"]["total_value"] > 0
+    assert [h["code"] for h in result["top_hs_headings"]] == ["0101"]
+
+
+@pytest.mark.parametrize("method", [
+    "query_concentration_metrics",
+    "query_sankey_data",
+    "query_province_comparison_metrics",
+])
+def test_tier1_queries_with_commodity_selected(db, method):
+    query = getattr(db, method)
+    assert query({**FILTERS, "hs_commodity": "01010000"}) == query(FILTERS)
+
+
+def test_tier2_replaces_empty_placeholder(db, tmp_path_factory):
+    """A Tier 2 file arriving after an empty start replaces the placeholder view."""
+    empty = TradeDatabase(str(tmp_path_factory.mktemp("empty")))
+    shutil.copy(db.tier2_file, empty.tier2_file)
+    empty._register_tier2_view()
+
+    assert [h["hs_heading"] for h in empty.get_hs_headings("01")] == ["0101"]
+    empty.close()
+
+
+def test_initialize_views_is_repeatable(db):
+    """Re-registering Tier 1 recreates its ENUM types instead of failing."""
+    before = db.query_dashboard_stats(FILTERS)
+    db._initialize_views()
+
+    assert db.query_dashboard_stats(FILTERS) == before
+
+
+def test_exclude_usa_drops_us_and_unknown_destinations(db):
+    """exclude_usa keeps only rows with a known, non-US destination on every tier."""
+    result = db.query_dashboard_stats({**FILTERS, "exclude_usa": True})
+    expected = db.conn.execute("""
+        SELECT SUM(value) FROM read_parquet(?)
+        WHERE hs_chapter = '01' AND destination NOT LIKE 'USA - %'
+    """, [str(db.tier1_file)]).fetchone()[0]
+
+    assert result["kpi"]["total_value"] == expected
+    assert sum(h["value"] for h in result["top_hs_headings"]) == expected